@@ -1,20 +1,98 @@
 import asyncio
-import json
+import hashlib
 import logging
 import uuid
 from datetime import datetime
-from typing import AsyncGenerator
+from typing import Any, AsyncGenerator, Dict, List, Optional
 
+import orjson
 from fastapi import APIRouter, HTTPException
-from sse_starlette.sse import EventSourceResponse
+from sse_starlette.sse import EventSourceResponse, ServerSentEvent
 
+from app.core.cache import TTLCache
+from app.core.config import settings
 from app.models.models import AskRequest
-from app.services.rag_chain import rag_chain
+from app.services.rag_chain import get_rag_chain
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# recent rag results, so repeated questions skip retrieval and generation
+_answer_cache = TTLCache(maxsize=settings.answer_cache_size, ttl=settings.answer_cache_ttl_seconds)
+
+
+def _answer_cache_key(question: str, chat_history: List[Dict]) -> bytes:
+    """Build a cache key from the normalized question and conversation history"""
+    history = [(msg.get("role"), msg.get("content")) for msg in chat_history]
+    payload = " ".join(question.lower().split()).encode() + b"|" + orjson.dumps(history)
+    return hashlib.blake2b(payload, digest_size=16).digest()
+
+
+class _StreamingRun:
+    """In-progress rag run whose answer chunks are fanned out to every request that joined it"""
+
+    def __init__(self, question: str, chat_history: List[Dict]):
+        self.parts: List[str] = []  # chunks streamed so far, replayed to requests that join late
+        self.finished = False
+        self._subscribers: List[asyncio.Queue] = []
+        self.task = asyncio.create_task(self._run(question, chat_history))
+
+    def subscribe(self) -> asyncio.Queue:
+        """Get a queue of the answer chunks, ending with None once the answer is complete"""
+        chunks: asyncio.Queue = asyncio.Queue()
+        if self.parts:
+            chunks.put_nowait("".join(self.parts))
+        if self.finished:
+            chunks.put_nowait(None)
+        else:
+            self._subscribers.append(chunks)
+        return chunks
+
+    def _publish(self, item: Optional[str]):
+        for chunks in self._subscribers:
+            chunks.put_nowait(item)
+
+    async def _run(self, question: str, chat_history: List[Dict]) -> Optional[Dict[str, Any]]:
+        result = None
+        try:
+            async for item in get_rag_chain().answer_question_stream(question, chat_history):
+                if isinstance(item, str):
+                    self.parts.append(item)
+                    self._publish(item)
+                else:
+                    result = item
+        finally:
+            self.finished = True
+            self._publish(None)  # end of answer
+        return result
+
+
+# in-progress rag runs, so concurrent identical questions share a single run
+_inflight: Dict[bytes, _StreamingRun] = {}
+
+
+def _finish_inflight(key: bytes, task: asyncio.Task):
+    """Drop a finished run from the in-flight map and cache its result"""
+    _inflight.pop(key, None)
+    if not task.cancelled() and task.exception() is None:
+        _answer_cache[key] = task.result()
+
+
+def _start_inflight(key: bytes, question: str, chat_history: List[Dict]) -> _StreamingRun:
+    """Start a streaming rag run that identical concurrent questions can join"""
+    run = _StreamingRun(question, chat_history)
+    run.task.add_done_callback(lambda done: _finish_inflight(key, done))
+    _inflight[key] = run
+    return run
+
+
+def _answer_chunk_event(chunk: str, session_id: str, is_complete: bool) -> ServerSentEvent:
+    return ServerSentEvent(
+        event="answer_chunk",
+        data=orjson.dumps({"chunk": chunk, "session_id": session_id, "is_complete": is_complete}).decode(),
+    )
+
 
 @router.post("/ask")
 async def ask_question(request: AskRequest):
@@ -24,65 +102,90 @@ async def ask_question(request: AskRequest):
         session_id = request.session_id or str(uuid.uuid4())
         logger.info(f"Starting Q&A session {session_id} for question: '{request.question[:50]}...'")
 
-        async def generate_stream() -> AsyncGenerator[dict, None]:
+        async def generate_stream() -> AsyncGenerator[ServerSentEvent, None]:
             try:
                 logger.info(f"Processing question for session {session_id}")
                 # get answer from rag chain with chat history
                 chat_history = []
                 if request.chat_history:
-                    chat_history = [msg.dict() for msg in request.chat_history]
+                    chat_history = [msg.model_dump() for msg in request.chat_history]
                     logger.info(f"Session {session_id}: Received {len(chat_history)} previous messages")
                 else:
                     logger.info(f"Session {session_id}: No previous conversation history")
 
-                result = await rag_chain.answer_question(request.question, chat_history)
-                logger.info(f"RAG chain completed for session {session_id}, found {len(result['sources'])} sources")
+                cache_key = _answer_cache_key(request.question, chat_history)
+                result = _answer_cache.get(cache_key)
+                if result is None:
+                    # stream the answer as the llm generates it, identical concurrent questions join the same run
+                    run = _inflight.get(cache_key)
+                    if run is None:
+                        run = _start_inflight(cache_key, request.question, chat_history)
+                        logger.info(f"Streaming live answer for session {session_id}")
+                    else:
+                        logger.info(f"Session {session_id}: Joining in-flight RAG run for the same question")
 
-                # stream answer in chunks
-                answer = result["answer"]
-                chunk_size = 50  # chars per chunk
-                total_chunks = (len(answer) + chunk_size - 1) // chunk_size
-                logger.info(
-                    f"Streaming answer for session {session_id}: {total_chunks} chunks, {len(answer)} characters"
-                )
+                    chunks = run.subscribe()
+                    pending = None  # latest piece, held back so the final chunk can be marked complete
+                    done = False
+                    while not done:
+                        parts = [await chunks.get()]
+                        # coalesce tokens that arrived in the meantime into a single event
+                        while not chunks.empty():
+                            parts.append(chunks.get_nowait())
+                        if parts[-1] is None:
+                            done = True
+                            parts.pop()
+                        if parts:
+                            if pending is not None:
+                                yield _answer_chunk_event(pending, session_id, is_complete=False)
+                            pending = "".join(parts)
+
+                    # shield so one client disconnecting doesn't cancel the run for the others
+                    result = await asyncio.shield(run.task)
+                    yield _answer_chunk_event(pending or "", session_id, is_complete=True)
+                    logger.info(
+                        f"RAG chain completed for session {session_id}, found {len(result['sources'])} sources"
+                    )
+                else:
+                    logger.info(f"Session {session_id}: Serving cached answer with {len(result['sources'])} sources")
 
-                for i in range(0, len(answer), chunk_size):
-                    chunk = answer[i : i + chunk_size]
-                    chunk_num = (i // chunk_size) + 1
-                    logger.debug(f"Session {session_id}: Sending chunk {chunk_num}/{total_chunks}: '{chunk[:30]}...'")
-                    yield {
-                        "event": "answer_chunk",
-                        "data": json.dumps(
-                            {"chunk": chunk, "session_id": session_id, "is_complete": i + chunk_size >= len(answer)}
-                        ),
-                    }
-                    await asyncio.sleep(0.1)  # small delay for streaming effect
+                    # stream the ready answer in chunks
+                    answer = result["answer"]
+                    chunk_size = 512  # chars per chunk
+                    total_chunks = (len(answer) + chunk_size - 1) // chunk_size
+                    logger.info(
+                        f"Streaming answer for session {session_id}: {total_chunks} chunks, {len(answer)} characters"
+                    )
+
+                    for i in range(0, len(answer), chunk_size):
+                        chunk = answer[i : i + chunk_size]
+                        chunk_num = (i // chunk_size) + 1
+                        logger.debug(
+                            "Session %s: Sending chunk %d/%d: '%.30s...'", session_id, chunk_num, total_chunks, chunk
+                        )
+                        yield _answer_chunk_event(chunk, session_id, is_complete=i + chunk_size >= len(answer))
 
                 # send final response with sources
-                sources_data = []
-                for source in result["sources"]:
-                    source_dict = source.dict()
-                    # ensure published_at is serialized as iso string
-                    if "published_at" in source_dict and isinstance(source_dict["published_at"], datetime):
-                        source_dict["published_at"] = source_dict["published_at"].isoformat()
-                    sources_data.append(source_dict)
+                # orjson encodes the datetimes natively, no json-mode conversion pass needed
+                sources_data = [source.model_dump() for source in result["sources"]]
 
                 logger.info(f"Session {session_id}: Sending completion with {len(sources_data)} sources")
-                yield {
-                    "event": "answer_complete",
-                    "data": json.dumps(
+                yield ServerSentEvent(
+                    event="answer_complete",
+                    data=orjson.dumps(
                         {
                             "sources": sources_data,
                             "session_id": session_id,
-                            "timestamp": datetime.utcnow().isoformat(),
-                        }
-                    ),
-                }
+                            "timestamp": datetime.utcnow(),
+                        },
+                        option=orjson.OPT_UTC_Z,
+                    ).decode(),
+                )
                 logger.info(f"Session {session_id}: Stream completed successfully")
 
             except Exception as e:
                 logger.error(f"Error in stream generation for session {session_id}: {e}", exc_info=True)
-                yield {"event": "error", "data": json.dumps({"error": str(e)})}
+                yield ServerSentEvent(event="error", data=orjson.dumps({"error": str(e)}).decode())
 
         return EventSourceResponse(generate_stream())
 
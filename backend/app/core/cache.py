@@ -0,0 +1,114 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, List, Optional, Sequence
+
+import numpy as np
+
+
+class TTLCache:
+    """Bounded in-process LRU cache whose entries expire after a fixed TTL"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get a live entry, dropping it if it has expired"""
+        item = self._data.get(key)
+        if item is None:
+            return default
+
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return default
+
+        self._data.move_to_end(key)
+        return value
+
+    def __setitem__(self, key: Hashable, value: Any):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        # evict least recently used entries beyond maxsize
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def clear(self):
+        self._data.clear()
+
+
+class SemanticCache:
+    """Bounded cache keyed by embedding similarity, a lookup hits when a stored key is close enough"""
+
+    def __init__(self, maxsize: int, ttl: float, threshold: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        self._keys: Optional[np.ndarray] = None  # (n, dim) matrix of unit-normalized float32 embeddings
+        self._values: List[Any] = []
+        self._expires_at: List[float] = []
+        self._last_used: List[float] = []
+
+    @staticmethod
+    def _normalize(embedding: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / (np.linalg.norm(vector) + 1e-12)
+
+    def _remove(self, indices: List[int]):
+        for index in sorted(indices, reverse=True):
+            del self._values[index], self._expires_at[index], self._last_used[index]
+        self._keys = np.delete(self._keys, indices, axis=0)
+
+    def get(self, embedding: Sequence[float], default: Any = None) -> Any:
+        """Get the value of the most similar live entry, if it is above the similarity threshold"""
+        now = time.monotonic()
+        expired = [i for i, expires_at in enumerate(self._expires_at) if expires_at <= now]
+        if expired:
+            self._remove(expired)
+        if not self._values:
+            return default
+
+        query = self._normalize(embedding)
+        if query.shape[0] != self._keys.shape[1]:
+            return default
+
+        # cosine similarity against every cached key in one matrix-vector product
+        scores = self._keys @ query
+        best = int(scores.argmax())
+        if scores[best] < self.threshold:
+            return default
+
+        self._last_used[best] = now
+        return self._values[best]
+
+    def put(self, embedding: Sequence[float], value: Any):
+        if self.maxsize <= 0:
+            return
+
+        key = self._normalize(embedding)
+        if self._keys is None or self._keys.shape[1] != key.shape[0]:
+            self.clear()
+            self._keys = np.empty((0, key.shape[0]), dtype=np.float32)
+
+        # evict the least recently used entry when full
+        if len(self._values) >= self.maxsize:
+            self._remove([int(np.argmin(self._last_used))])
+
+        now = time.monotonic()
+        self._keys = np.vstack([self._keys, key])
+        self._values.append(value)
+        self._expires_at.append(now + self.ttl)
+        self._last_used.append(now)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def clear(self):
+        self._keys = None
+        self._values.clear()
+        self._expires_at.clear()
+        self._last_used.clear()
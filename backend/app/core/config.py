@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic_settings import BaseSettings
 
 
@@ -11,13 +13,26 @@ class Settings(BaseSettings):
     # Database
     qdrant_host: str = "localhost"
     qdrant_port: int = 6333
+    qdrant_grpc_port: int = 6334
+    qdrant_prefer_grpc: bool = True
     qdrant_collection: str = "crypto_news"
 
     # Model settings
     embedding_model: str = "text-embedding-3-small"
     llm_model: str = "gpt-4o"
-    embedding_batch_size: int = 8
+    embedding_batch_size: int = 128
     max_retrieval_results: int = 10
+    retrieval_score_threshold: Optional[float] = None  # min similarity for retrieved articles, unset keeps all
+    max_history_turns: int = 6  # user/assistant exchanges kept as conversation context
+
+    # Answer cache
+    answer_cache_size: int = 256
+    answer_cache_ttl_seconds: int = 120
+
+    # Semantic query cache
+    query_cache_size: int = 256
+    query_cache_ttl_seconds: int = 300
+    query_cache_similarity: float = 0.92
 
     class Config:
         env_file = ".env"
@@ -1,9 +1,31 @@
+import asyncio
 import logging
-from datetime import datetime
-from typing import List, Optional
-
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, FieldCondition, Filter, MatchValue, PointStruct, VectorParams
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import List, Optional, Set
+
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import (
+    Datatype,
+    Distance,
+    FieldCondition,
+    Filter,
+    HnswConfigDiff,
+    IsEmptyCondition,
+    OptimizersConfigDiff,
+    PayloadField,
+    PayloadSchemaType,
+    PointStruct,
+    QuantizationSearchParams,
+    Range,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    SearchParams,
+    VectorParams,
+)
 
 from app.core.config import settings
 from app.models.models import NewsArticle
@@ -11,23 +33,65 @@ from app.models.models import NewsArticle
 logger = logging.getLogger(__name__)
 
 
+# Namespace for article point ids, ids must stay stable across restarts for deduplication
+POINT_NS = uuid.NAMESPACE_URL
+
+
+# feeds return mostly the same urls every cycle, and each url is looked up then upserted
+@lru_cache(maxsize=4096)
+def article_point_id(url: str) -> str:
+    """Get the Qdrant point id for an article url"""
+    return str(uuid.uuid5(POINT_NS, url))
+
+
 class VectorStore:
     """Qdrant vector store for crypto news articles"""
 
     def __init__(self):
-        self.client = QdrantClient(host=settings.qdrant_host, port=settings.qdrant_port)
+        self.client = AsyncQdrantClient(
+            host=settings.qdrant_host,
+            port=settings.qdrant_port,
+            grpc_port=settings.qdrant_grpc_port,
+            prefer_grpc=settings.qdrant_prefer_grpc,
+            timeout=30,
+        )
         self.collection_name = settings.qdrant_collection
         # Note: _ensure_collection will be called when needed in async methods
+        self._collection_ready = False
+        self._collection_lock = asyncio.Lock()
+        # article count is polled by health checks, so it is cached for count_ttl seconds
+        self.count_ttl = 30
+        self._article_count: Optional[int] = None
+        self._article_count_expires_at = 0.0
+
+    async def close(self):
+        """Close the Qdrant client connections"""
+        await self.client.close()
+
+    async def initialize(self):
+        """Ensure the collection exists ahead of the first request"""
+        await self._ensure_collection()
 
     async def _ensure_collection(self):
-        """Ensure the collection exists with proper configuration"""
+        """Ensure the collection exists with proper configuration (checked once per process)"""
+        if self._collection_ready:
+            return
+
+        async with self._collection_lock:
+            if self._collection_ready:
+                return
+            await self._create_collection_if_missing()
+            self._collection_ready = True
+
+    async def _create_collection_if_missing(self):
+        """Create the collection if it does not exist yet"""
         try:
-            collections = self.client.get_collections()
+            collections = await self.client.get_collections()
             collection_names = [c.name for c in collections.collections]
 
             if self.collection_name not in collection_names:
                 # Try to determine the correct vector size based on the embedding service
-                from app.embeddings import embedding_service
+                from app.core.embeddings import embedding_service
 
                 try:
                     # Test with a small text to get the embedding dimension
@@ -38,18 +102,117 @@ class VectorStore:
                     logger.warning(f"Could not determine embedding dimension, using default 1536: {e}")
                     vector_size = 1536  # Default to OpenAI dimension
 
-                self.client.create_collection(
+                await self.client.create_collection(
                     collection_name=self.collection_name,
-                    vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE),
+                    # embeddings are unit-normalized on the client, so dot product ranks like cosine
+                    # fp16 originals (used only for rescoring) halve vector storage with negligible recall loss
+                    vectors_config=VectorParams(size=vector_size, distance=Distance.DOT, datatype=Datatype.FLOAT16),
+                    # int8 copies of the vectors kept in RAM, ~4x smaller than fp32 with near-identical recall
+                    quantization_config=ScalarQuantization(
+                        scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+                    ),
+                    # denser graph for better recall, built once per article
+                    hnsw_config=HnswConfigDiff(m=24, ef_construct=200),
+                    # payloads are only read for results, keep them on disk instead of in RAM
+                    on_disk_payload=True,
+                    optimizers_config=OptimizersConfigDiff(memmap_threshold=20000),
                 )
                 logger.info(f"Created collection: {self.collection_name} with {vector_size} dimensions")
             else:
                 logger.info(f"Collection {self.collection_name} already exists")
+                await self._migrate_legacy_points()
+
+            # index publish time so recency filters don't scan every payload
+            await self.client.create_payload_index(
+                collection_name=self.collection_name,
+                field_name="published_timestamp",
+                field_schema=PayloadSchemaType.FLOAT,
+            )
+            # index url for grouping search results by article
+            await self.client.create_payload_index(
+                collection_name=self.collection_name,
+                field_name="url",
+                field_schema=PayloadSchemaType.KEYWORD,
+            )
 
         except Exception as e:
             logger.error(f"Error ensuring collection: {e}")
             raise
 
+    async def _migrate_legacy_points(self, batch_size: int = 256):
+        """Re-key points stored under the old per-process hash ids to their url-derived ids"""
+        # those points predate the published_timestamp field, so they are matched by its absence
+        # and moved with their stored vectors, no re-embedding needed
+        legacy_filter = Filter(must=[IsEmptyCondition(is_empty=PayloadField(key="published_timestamp"))])
+        migrated = 0
+        try:
+            offset = None
+            while True:
+                points, offset = await self.client.scroll(
+                    collection_name=self.collection_name,
+                    scroll_filter=legacy_filter,
+                    limit=batch_size,
+                    offset=offset,
+                    with_payload=True,
+                    with_vectors=True,
+                )
+                if not points:
+                    break
+
+                new_points = []
+                for point in points:
+                    article = self._article_from_payload(point.payload)
+                    new_points.append(
+                        PointStruct(
+                            id=article_point_id(article.url),
+                            vector=point.vector,
+                            payload=self._article_payload(article),
+                        )
+                    )
+                await self.client.upsert(collection_name=self.collection_name, points=new_points)
+                await self.client.delete(
+                    collection_name=self.collection_name, points_selector=[point.id for point in points]
+                )
+                migrated += len(points)
+
+                if offset is None:
+                    break
+
+            if migrated:
+                logger.info(f"Migrated {migrated} articles from legacy point ids")
+        except Exception as e:
+            logger.error(f"Error migrating legacy points ({migrated} migrated so far): {e}", exc_info=True)
+
+    @staticmethod
+    def _article_payload(article: NewsArticle) -> dict:
+        """Build the point payload stored alongside an article embedding"""
+        published_at = article.published_at
+        if published_at.tzinfo is None:
+            published_at = published_at.replace(tzinfo=timezone.utc)
+
+        return {
+            "title": article.title,
+            "url": article.url,
+            "source": article.source,
+            "published_at": article.published_at.isoformat(),
+            # numeric copy of published_at for range filtering
+            "published_timestamp": published_at.timestamp(),
+            "content": article.content,
+            "summary": article.summary,
+        }
+
+    @staticmethod
+    def _article_from_payload(payload: dict) -> NewsArticle:
+        """Rebuild an article from a stored payload, skipping validation of trusted data"""
+        return NewsArticle.model_construct(
+            title=payload["title"],
+            url=payload["url"],
+            source=payload["source"],
+            published_at=datetime.fromisoformat(payload["published_at"]),
+            content=payload.get("content"),
+            summary=payload.get("summary"),
+        )
+
     async def add_articles(self, articles: List[NewsArticle], embeddings: List[List[float]]):
         """Add articles with their embeddings to the vector store"""
         try:
@@ -58,21 +221,14 @@ class VectorStore:
             points = []
             for article, embedding in zip(articles, embeddings):
                 point = PointStruct(
-                    id=abs(hash(article.url)) % (2**63),  # Convert to positive unsigned 64-bit integer
+                    id=article_point_id(article.url),
                     vector=embedding,
-                    payload={
-                        "title": article.title,
-                        "url": article.url,
-                        "source": article.source,
-                        "published_at": article.published_at.isoformat(),
-                        "content": article.content,
-                        "summary": article.summary,
-                    },
+                    payload=self._article_payload(article),
                 )
                 points.append(point)
 
             # Use upsert to handle duplicates
-            self.client.upsert(collection_name=self.collection_name, points=points)
+            await self.client.upsert(collection_name=self.collection_name, points=points)
             logger.info(f"Added {len(articles)} articles to vector store")
 
         except Exception as e:
@@ -85,20 +241,13 @@ class VectorStore:
             await self._ensure_collection()
 
             point = PointStruct(
-                id=abs(hash(article.url)) % (2**63),  # Convert to positive unsigned 64-bit integer
+                id=article_point_id(article.url),
                 vector=embedding,
-                payload={
-                    "title": article.title,
-                    "url": article.url,
-                    "source": article.source,
-                    "published_at": article.published_at.isoformat(),
-                    "content": article.content,
-                    "summary": article.summary,
-                },
+                payload=self._article_payload(article),
             )
 
-            self.client.upsert(collection_name=self.collection_name, points=[point])
-            logger.debug(f"DB: Stored article '{article.title[:50]}...' from {article.source}")
+            await self.client.upsert(collection_name=self.collection_name, points=[point])
+            logger.debug("DB: Stored article '%.50s...' from %s", article.title, article.source)
 
         except Exception as e:
             logger.error(f"Error adding article '{article.title[:50]}...' to vector store: {e}", exc_info=True)
@@ -106,46 +255,71 @@ class VectorStore:
 
     async def article_exists(self, url: str) -> bool:
         """Check if an article with the given URL already exists"""
+        return url in await self.urls_exist([url])
+
+    async def urls_exist(self, urls: List[str]) -> Set[str]:
+        """Get the subset of the given URLs that already exist, using a single lookup"""
+        if not urls:
+            return set()
+
         try:
             await self._ensure_collection()
 
-            point_id = abs(hash(url)) % (2**63)  # Use same hash calculation as add_article
-            result = self.client.retrieve(collection_name=self.collection_name, ids=[point_id], with_payload=True)
-            return len(result) > 0
+            point_ids = {article_point_id(url): url for url in urls}
+            result = await self.client.retrieve(
+                collection_name=self.collection_name, ids=list(point_ids), with_payload=False, with_vectors=False
+            )
+            return {point_ids[str(point.id)] for point in result}
         except Exception as e:
-            logger.debug(f"Error checking article existence: {e}")
-            return False
+            logger.error(f"Error checking article existence: {e}")
+            raise
 
     async def search_similar(
-        self, query_embedding: List[float], limit: int = 5, filters: Optional[Filter] = None
+        self,
+        query_embedding: List[float],
+        limit: int = 5,
+        filters: Optional[Filter] = None,
+        distinct_on: Optional[str] = "url",
+        score_threshold: Optional[float] = None,
     ) -> List[NewsArticle]:
-        """Search for similar articles"""
+        """Search for similar articles, returning at most one article per distinct_on value
+
+        Filtering, deduplication and the score cutoff all run inside Qdrant.
+        """
         try:
             await self._ensure_collection()
 
-            logger.debug(f"DB: Searching for {limit} similar articles")
-            search_result = self.client.search(
-                collection_name=self.collection_name,
-                query_vector=query_embedding,
-                limit=limit,
-                query_filter=filters,
-                with_payload=True,
-            )
+            # rescore the quantized candidates against the original vectors
+            search_params = SearchParams(hnsw_ef=128, quantization=QuantizationSearchParams(rescore=True))
 
-            articles = []
-            for result in search_result:
-                payload = result.payload
-                article = NewsArticle(
-                    title=payload["title"],
-                    url=payload["url"],
-                    source=payload["source"],
-                    published_at=datetime.fromisoformat(payload["published_at"]),
-                    content=payload.get("content"),
-                    summary=payload.get("summary"),
+            logger.debug("DB: Searching for %d similar articles", limit)
+            if distinct_on:
+                # group server-side so duplicates never cross the wire and limit counts unique articles
+                groups_result = await self.client.query_points_groups(
+                    collection_name=self.collection_name,
+                    group_by=distinct_on,
+                    query=query_embedding,
+                    query_filter=filters,
+                    search_params=search_params,
+                    limit=limit,
+                    group_size=1,
+                    score_threshold=score_threshold,
+                    with_payload=True,
                 )
-                articles.append(article)
+                articles = [self._article_from_payload(group.hits[0].payload) for group in groups_result.groups]
+            else:
+                search_result = await self.client.search(
+                    collection_name=self.collection_name,
+                    query_vector=query_embedding,
+                    limit=limit,
+                    query_filter=filters,
+                    score_threshold=score_threshold,
+                    with_payload=True,
+                    search_params=search_params,
+                )
+                articles = [self._article_from_payload(result.payload) for result in search_result]
 
-            logger.debug(f"DB: Found {len(articles)} similar articles")
+            logger.debug("DB: Found %d similar articles", len(articles))
             return articles
 
         except Exception as e:
@@ -157,59 +331,40 @@ class VectorStore:
         try:
             await self._ensure_collection()
 
-            from datetime import datetime, timedelta
-
-            cutoff_time = datetime.utcnow() - timedelta(hours=hours)
+            cutoff_time = datetime.now(timezone.utc) - timedelta(hours=hours)
 
             # Create filter for recent articles
             filter_condition = Filter(
-                must=[
-                    FieldCondition(
-                        key="published_at",
-                        match=MatchValue(value=cutoff_time.isoformat(), range={"gte": cutoff_time.isoformat()}),
-                    )
-                ]
+                must=[FieldCondition(key="published_timestamp", range=Range(gte=cutoff_time.timestamp()))]
             )
 
-            # Get the vector size from the collection
-            collection_info = self.client.get_collection(self.collection_name)
-            vector_size = collection_info.config.params.vectors.size
-
-            # Search with filter (using zero vector to get all recent articles)
-            search_result = self.client.search(
+            # Scroll with filter (payload-only lookup, no vector search needed)
+            points, _ = await self.client.scroll(
                 collection_name=self.collection_name,
-                query_vector=[0.0] * vector_size,  # Dummy vector with correct size
+                scroll_filter=filter_condition,
                 limit=100,
-                query_filter=filter_condition,
                 with_payload=True,
+                with_vectors=False,
             )
 
-            articles = []
-            for result in search_result:
-                payload = result.payload
-                article = NewsArticle(
-                    title=payload["title"],
-                    url=payload["url"],
-                    source=payload["source"],
-                    published_at=datetime.fromisoformat(payload["published_at"]),
-                    content=payload.get("content"),
-                    summary=payload.get("summary"),
-                )
-                articles.append(article)
-
-            return articles
+            return [self._article_from_payload(point.payload) for point in points]
 
         except Exception as e:
             logger.error(f"Error getting recent articles: {e}")
             raise
 
     async def get_article_count(self) -> int:
-        """Get total number of articles in the database"""
+        """Get total number of articles in the database (cached for count_ttl seconds)"""
+        if self._article_count is not None and time.monotonic() < self._article_count_expires_at:
+            return self._article_count
+
         try:
             await self._ensure_collection()
 
-            collection_info = self.client.get_collection(self.collection_name)
-            return collection_info.points_count
+            collection_info = await self.client.get_collection(self.collection_name)
+            self._article_count = collection_info.points_count
+            self._article_count_expires_at = time.monotonic() + self.count_ttl
+            return self._article_count
         except Exception as e:
             logger.error(f"Error getting article count: {e}")
             return 0
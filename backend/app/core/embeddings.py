@@ -1,45 +1,92 @@
+import asyncio
+import importlib.util
 import logging
-from typing import List
+import threading
+from typing import List, Optional, Set, Tuple
 
-from dotenv import load_dotenv
+import httpx
+import numpy as np
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_openai import OpenAIEmbeddings
 
 from app.core.config import settings
 
-load_dotenv()
-
 logger = logging.getLogger(__name__)
 
+HF_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+# int8-quantized ONNX export shipped in the model repo, runs on any AVX2 x86 CPU
+HF_ONNX_FILE_NAME = "onnx/model_quint8_avx2.onnx"
+
+
+# pooled client shared by every OpenAI call (embeddings and chat) so requests reuse warm connections,
+# over http/2 concurrent calls are multiplexed on a single connection
+openai_http_client = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+    timeout=httpx.Timeout(600, connect=5),
+)
+
+
+def _normalize(embeddings: List[List[float]]) -> List[List[float]]:
+    """L2-normalize embeddings so the vector store can rank by plain dot product"""
+    if not embeddings:
+        return embeddings
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+    return vectors.tolist()
+
+
+def _hf_model_kwargs() -> dict:
+    """Use the quantized ONNX Runtime backend when it is installed, PyTorch otherwise"""
+    if importlib.util.find_spec("optimum") and importlib.util.find_spec("onnxruntime"):
+        return {"device": "cpu", "backend": "onnx", "model_kwargs": {"file_name": HF_ONNX_FILE_NAME}}
+    return {"device": "cpu"}
+
 
 class EmbeddingService:
     """Service for generating embeddings using OpenAI or HuggingFace"""
 
     def __init__(self):
+        # chunk_size caps texts per request, longer lists are split into several requests
         self.openai_embeddings = OpenAIEmbeddings(
-            model=settings.embedding_model, openai_api_key=settings.openai_api_key
+            model=settings.embedding_model,
+            openai_api_key=settings.openai_api_key,
+            chunk_size=settings.embedding_batch_size,
+            http_async_client=openai_http_client,
         )
 
-        # Fallback to HuggingFace if needed
-        self.hf_embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2",
-            model_kwargs={"device": "cpu"},
-            encode_kwargs={"normalize_embeddings": True},
-        )
+        # Fallback to HuggingFace if needed, loaded on first use
+        self._hf_embeddings: Optional[HuggingFaceEmbeddings] = None
+        self._hf_lock = threading.Lock()
 
         self.use_openai = True
 
+    @property
+    def hf_embeddings(self) -> HuggingFaceEmbeddings:
+        """HuggingFace embeddings model, loaded lazily since it is only a fallback"""
+        with self._hf_lock:
+            if self._hf_embeddings is None:
+                model_kwargs = _hf_model_kwargs()
+                self._hf_embeddings = HuggingFaceEmbeddings(
+                    model_name=HF_MODEL_NAME,
+                    model_kwargs=model_kwargs,
+                    encode_kwargs={"normalize_embeddings": True, "batch_size": settings.embedding_batch_size},
+                )
+                logger.info(f"Loaded HuggingFace embeddings ({model_kwargs.get('backend', 'torch')} backend)")
+            return self._hf_embeddings
+
     async def get_embeddings(self, texts: List[str]) -> List[List[float]]:
         """Get embeddings for a list of texts"""
         try:
             if self.use_openai:
                 embeddings = await self.openai_embeddings.aembed_documents(texts)
                 logger.info(f"Generated {len(embeddings)} embeddings using OpenAI")
-                return embeddings
+                return _normalize(embeddings)
             else:
-                embeddings = self.hf_embeddings.embed_documents(texts)
+                # model loading and inference are cpu-bound, keep them off the event loop
+                embeddings = await asyncio.to_thread(lambda: self.hf_embeddings.embed_documents(texts))
                 logger.info(f"Generated {len(embeddings)} embeddings using HuggingFace")
-                return embeddings
+                return _normalize(embeddings)
 
         except Exception as e:
             logger.error(f"Error generating embeddings: {e}")
@@ -62,5 +109,84 @@ class EmbeddingService:
         logger.info("Switched to HuggingFace embeddings")
 
 
+class BatchedEmbeddingClient:
+    """Coalesces concurrent single-text embedding requests into batched embedding calls"""
+
+    def __init__(self, service: EmbeddingService, max_batch: int = 32, max_wait_ms: float = 10):
+        self.service = service
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._worker: Optional[asyncio.Task] = None
+        self._batches: Set[asyncio.Task] = set()
+
+    async def get_embedding(self, text: str) -> List[float]:
+        """Get embedding for a single text, batched with other concurrent requests"""
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._collect_batches())
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def close(self):
+        """Stop the batching worker and any batches still being embedded"""
+        tasks = [*self._batches] + ([self._worker] if self._worker else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._worker = None
+
+        # callers still waiting in the queue are cancelled rather than left hanging
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            future.cancel()
+
+    async def _collect_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # wait for a first request, then fill the batch until it is full or the window closes
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            # embed in the background so the next batch can be collected meanwhile
+            task = asyncio.create_task(self._embed_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _embed_batch(self, batch: List[Tuple[str, asyncio.Future]]):
+        # skip requests whose callers have gone away
+        batch = [(text, future) for text, future in batch if not future.done()]
+        if not batch:
+            return
+
+        try:
+            embeddings = await self.service.get_embeddings([text for text, _ in batch])
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), embedding in zip(batch, embeddings):
+            if not future.done():
+                future.set_result(embedding)
+
+
 # Global embedding service instance
 embedding_service = EmbeddingService()
+
+# Query-time embeddings, batched across concurrent requests
+query_embedder = BatchedEmbeddingClient(embedding_service)
@@ -6,6 +6,8 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.routes import router as api_router
+from app.core.database import vector_store
+from app.core.embeddings import openai_http_client, query_embedder
 from app.services.news_ingestion import news_service
 
 # Load environment variables from .env file
@@ -17,6 +19,10 @@ async def lifespan(app: FastAPI):
     # Startup
     print("Starting Crypto News Agent Backend")
     print("Initializing services...")
+    try:
+        await vector_store.initialize()
+    except Exception as e:
+        print(f"Vector store initialization failed, will retry on first request: {e}")
 
     # Start background news ingestion
     print("Starting news ingestion service...")
@@ -25,6 +31,10 @@ async def lifespan(app: FastAPI):
     yield
     # Shutdown
     print("Shutting down Crypto News Agent Backend")
+    await news_service.close()
+    await vector_store.close()
+    await query_embedder.close()
+    await openai_http_client.aclose()
 
 
 app = FastAPI(
@@ -2,9 +2,10 @@ import asyncio
 import logging
 from datetime import datetime, timedelta
 from email.utils import parsedate_to_datetime
-from typing import List
+from typing import List, Optional
 
 import feedparser
+import httpx
 from newsapi import NewsApiClient
 
 from app.core.config import settings
@@ -32,11 +33,25 @@ class NewsIngestionService:
 
         # rss feeds as backup
         self.rss_feeds = ["https://www.dlnews.com/arc/outboundfeeds/rss/", "https://cointelegraph.com/rss"]
+        # shared client so feed downloads reuse pooled connections
+        self.http_client = httpx.AsyncClient(http2=True, timeout=15, follow_redirects=True)
+
+        # fetched articles wait here for the consumers to embed and store them
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=1000)
+        self.num_consumers = 4
+        self.batch_size = 64  # max articles per consumer batch
+        self.batch_timeout = 5  # max seconds to wait for a batch to fill
+        self.max_embed_chars = 2000  # cap on text sent for embedding per article
 
     async def start_ingestion(self):
         logger.info("Starting real-time crypto news ingestion service")
         logger.info(f"Configuration: {self.fetch_interval}s intervals, {len(self.crypto_keywords)} keywords")
 
+        # fetching and embedding/storing overlap: one producer feeds the queue, consumers drain it
+        await asyncio.gather(self._produce(), *(self._consume() for _ in range(self.num_consumers)))
+
+    async def _produce(self):
+        """Fetch news on a fixed interval and queue the articles for processing"""
         # initial fetch to populate db with recent articles
         logger.info(f"Performing initial fetch for last {self.initial_fetch_hours} hours...")
         await self._fetch_news(use_initial_fetch=True)
@@ -57,33 +72,61 @@ class NewsIngestionService:
     async def _fetch_news(self, use_initial_fetch: bool = False):
         """Fetch news from both NewsAPI and RSS feeds"""
         try:
-            # try newsapi first
-            newsapi_articles = await self._fetch_newsapi(use_initial_fetch)
-
-            # always fetch from rss as backup
-            rss_articles = await self._fetch_rss_feeds()
+            # fetch newsapi and rss (always, as backup) concurrently
+            newsapi_articles, rss_articles = await asyncio.gather(
+                self._fetch_newsapi(use_initial_fetch), self._fetch_rss_feeds()
+            )
 
-            # combine and process all articles
+            # combine and queue all articles, blocks while the consumers are behind
             all_articles = newsapi_articles + rss_articles
             logger.info(f"Total articles fetched: {len(newsapi_articles)} from NewsAPI, {len(rss_articles)} from RSS")
+            self.last_fetch_time = datetime.utcnow()
 
-            processed_count = 0
+            # dedupe by url across sources here, copies split over concurrent consumer batches would both be embedded
+            unique_articles = {}
             for article_data in all_articles:
-                if await self._process_article(article_data):
-                    processed_count += 1
+                unique_articles.setdefault((article_data.get("url") or "").strip(), article_data)
 
-            self.total_articles_processed += processed_count
-
-            if processed_count > 0:
-                logger.info(
-                    f"Successfully processed {processed_count} new articles (total: {self.total_articles_processed})"
-                )
-            else:
-                logger.debug("No new articles to process")
+            for article_data in unique_articles.values():
+                await self.queue.put(article_data)
 
         except Exception as e:
             logger.error(f"Error fetching news: {e}")
 
+    async def _consume(self):
+        """Embed and store queued articles in batches"""
+        loop = asyncio.get_running_loop()
+        while True:
+            # wait for a first article, then fill the batch until it is full or the timeout hits
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.batch_timeout
+            while len(batch) < self.batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                processed_count = await self._process_articles(batch)
+                self.total_articles_processed += processed_count
+
+                if processed_count > 0:
+                    logger.info(
+                        f"Successfully processed {processed_count} new articles "
+                        f"(total: {self.total_articles_processed})"
+                    )
+                else:
+                    logger.debug("No new articles to process")
+
+            except Exception as e:
+                logger.error(f"Error processing batch of {len(batch)} articles: {e}", exc_info=True)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
     async def _fetch_newsapi(self, use_initial_fetch: bool = False) -> List[dict]:
         """Fetch news from NewsAPI"""
         try:
@@ -129,15 +172,30 @@ class NewsIngestionService:
         """Fetch news from RSS feeds"""
         all_articles = []
 
-        for feed_url in self.rss_feeds:
-            try:
-                logger.debug(f"Fetching RSS feed: {feed_url}")
+        # download all feeds concurrently
+        logger.debug(f"Fetching {len(self.rss_feeds)} RSS feeds")
+        responses = await asyncio.gather(
+            *(self.http_client.get(feed_url) for feed_url in self.rss_feeds), return_exceptions=True
+        )
+
+        bodies = {}
+        for feed_url, response in zip(self.rss_feeds, responses):
+            if isinstance(response, Exception):
+                logger.error(f"Error fetching RSS feed {feed_url}: {response}")
+            elif response.is_error:
+                logger.error(f"Error fetching RSS feed {feed_url}: HTTP {response.status_code}")
+            else:
+                bodies[feed_url] = response.content
 
-                # feedparser is sync, so run in thread
-                def fetch_rss():
-                    return feedparser.parse(feed_url)
+        # feedparser is sync, so parse in threads
+        feeds = await asyncio.gather(
+            *(asyncio.to_thread(feedparser.parse, body) for body in bodies.values()), return_exceptions=True
+        )
 
-                feed = await asyncio.to_thread(fetch_rss)
+        for feed_url, feed in zip(bodies, feeds):
+            try:
+                if isinstance(feed, Exception):
+                    raise feed
 
                 if feed.bozo:
                     logger.warning(f"RSS feed parsing error for {feed_url}: {feed.bozo_exception}")
@@ -164,13 +222,13 @@ class NewsIngestionService:
                 logger.debug(f"Retrieved {len(feed.entries)} articles from {feed_url}")
 
             except Exception as e:
-                logger.error(f"Error fetching RSS feed {feed_url}: {e}")
+                logger.error(f"Error parsing RSS feed {feed_url}: {e}")
                 continue
 
         logger.info(f"RSS fetch: Retrieved {len(all_articles)} total articles from {len(self.rss_feeds)} feeds")
         return all_articles
 
-    async def _process_article(self, article_data: dict) -> bool:
+    def _parse_article(self, article_data: dict) -> Optional[NewsArticle]:
         try:
             title = article_data.get("title", "").strip()
             url = article_data.get("url", "").strip()
@@ -183,21 +241,45 @@ class NewsIngestionService:
             else:
                 published_at = datetime.utcnow()
             if not title or not url:
-                return False
-            article = NewsArticle(
+                return None
+            # title-only articles are rarely useful and not worth embedding
+            if not (description or content):
+                return None
+            return NewsArticle(
                 title=title, url=url, source=source, published_at=published_at, content=content, summary=description
             )
-            if await vector_store.article_exists(url):
-                logger.debug(f"Article already exists, skipping: {title[:50]}...")
-                return False
-            text_to_embed = f"{title}. {description}. {content}"
-            embedding = await embedding_service.get_embedding(text_to_embed)
-            await vector_store.add_article(article, embedding)
-            logger.debug(f"Stored article: {title[:50]}...")
-            return True
         except Exception as e:
             logger.error(f"Error processing article: {e}")
-            return False
+            return None
+
+    async def _process_articles(self, articles_data: List[dict]) -> int:
+        """Dedupe, embed and store new articles with one call per stage"""
+        # phase 1: parse and dedupe in-process, then drop articles already stored
+        candidates = {}
+        for article_data in articles_data:
+            article = self._parse_article(article_data)
+            if article:
+                candidates.setdefault(article.url, article)
+
+        existing_urls = await vector_store.urls_exist(list(candidates))
+        articles = [article for url, article in candidates.items() if url not in existing_urls]
+        if not articles:
+            return 0
+
+        # phase 2: embed all new articles in a single batched request
+        # content is usually a truncated snippet, so embed title + description and keep content in the payload
+        texts = [
+            f"{article.title}. {article.summary or article.content}"[: self.max_embed_chars] for article in articles
+        ]
+        embeddings = await embedding_service.get_embeddings(texts)
+
+        # phase 3: store all new articles in a single upsert
+        await vector_store.add_articles(articles, embeddings)
+        return len(articles)
+
+    async def close(self):
+        """Close the shared HTTP client"""
+        await self.http_client.aclose()
 
     async def get_latest_articles_from_db(self, limit: int = 10) -> List[NewsArticle]:
         """Get the latest articles from the database (not from NewsAPI)"""
@@ -216,6 +298,7 @@ class NewsIngestionService:
                 "total_processed": self.total_articles_processed,
                 "fetch_cycles": self.fetch_cycles,
                 "fetch_interval_seconds": self.fetch_interval,
+                "queued_articles": self.queue.qsize(),
                 "last_fetch_time": self.last_fetch_time.isoformat() if self.last_fetch_time else None,
                 "keywords_count": len(self.crypto_keywords),
                 "keywords": self.crypto_keywords,
@@ -1,26 +1,55 @@
+import asyncio
 import logging
-from typing import Any, Dict, List
+import re
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple, Union
 
+from app.core.cache import SemanticCache
 from app.core.config import settings
 from app.core.database import vector_store
-from app.core.embeddings import embedding_service
+from app.core.embeddings import openai_http_client, query_embedder
 from app.models.models import NewsArticle
-from dotenv import load_dotenv
-from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_openai import ChatOpenAI
 
-load_dotenv()
-
 logger = logging.getLogger(__name__)
 
+_MESSAGE_TYPES = {"user": HumanMessage, "assistant": AIMessage}
+
+# refusal phrases the history prompt may return instead of a search query
+_MODERATION_PATTERN = re.compile(r"I cannot help with that request|I can't assist|As an AI")
+
+# questions about the current moment should always see the latest articles
+_TIME_SENSITIVE_PATTERN = re.compile(r"\b(today|now|latest|breaking)\b", re.IGNORECASE)
+
+
+def _same_terms(a: str, b: str) -> bool:
+    """Cheap check for two queries made of the same set of words"""
+    return set(re.findall(r"\w+", a.lower())) == set(re.findall(r"\w+", b.lower()))
+
 
 class RAGChain:
     """Retrieval-Augmented Generation chain for crypto news Q&A with chat history"""
 
     def __init__(self):
-        self.llm = ChatOpenAI(model=settings.llm_model, temperature=0.1, streaming=True)
+        self.llm = ChatOpenAI(
+            model=settings.llm_model,
+            api_key=settings.openai_api_key,
+            temperature=0.1,
+            streaming=True,
+            http_async_client=openai_http_client,
+        )
+        # articles retrieved for recent queries, reused for near-duplicate queries
+        self.query_cache = SemanticCache(
+            maxsize=settings.query_cache_size,
+            ttl=settings.query_cache_ttl_seconds,
+            threshold=settings.query_cache_similarity,
+        )
         self._setup_prompts()
+        # compose the history prompt | llm pipeline once rather than per question
+        # cache keys route each prompt to servers holding its cached prefix
+        self._history_chain = self.history_prompt | self.llm.bind(extra_body={"prompt_cache_key": "rag_history_v1"})
+        self._answer_kwargs = {"extra_body": {"prompt_cache_key": "rag_answer_v1"}}
 
     def _setup_prompts(self):
         """Setup the prompts for history-aware retrieval"""
@@ -51,63 +80,64 @@ class RAGChain:
             ]
         )
 
-        # Prompt for answering with retrieved context
-        self.answer_prompt = ChatPromptTemplate.from_messages(
-            [
-                (
-                    "system",
-                    (
-                        "You are a helpful AI assistant that answers questions about cryptocurrency news and events.\n"
-                        "You have access to recent crypto news articles retrieved from our database.\n"
-                        "Use these articles as your primary source of information to answer the user's question.\n"
-                        "The chat history is provided only for conversational context, not as a source of news facts.\n"
-                        "If the articles contain relevant information, provide a detailed answer based on them.\n"
-                        "If the articles don't contain specific information about the question, acknowledge this, but "
-                        "provide any related insights from the available articles.\n"
-                        "Do not make up information that is not present in the articles.\n"
-                        "Keep the answer concise and informative.\n"
-                        "\n"
-                        "IMPORTANT SAFETY GUIDELINES:\n"
-                        "- Do not provide advice on illegal activities, scams, or fraudulent schemes\n"
-                        "- Do not promote harmful financial practices or risky investments\n"
-                        "- Do not generate content that could be considered offensive, discriminatory, or inappropriate\n"
-                        "- If asked about potentially harmful topics, politely redirect to legitimate crypto news and "
-                        "information\n"
-                        "- Focus on factual, educational content about cryptocurrency markets and technology\n"
-                        "\n"
-                        "Retrieved News Articles:\n"
-                        "{context}"
-                    ),
-                ),
-                MessagesPlaceholder(variable_name="chat_history"),
-                ("human", "{question}"),
-            ]
+        # Static instructions for answering with retrieved context, built once and sent as is
+        self.answer_instructions = SystemMessage(
+            content=(
+                "You are a helpful AI assistant that answers questions about cryptocurrency news and events.\n"
+                "You have access to recent crypto news articles retrieved from our database.\n"
+                "Use these articles as your primary source of information to answer the user's question.\n"
+                "The chat history is provided only for conversational context, not as a source of news facts.\n"
+                "If the articles contain relevant information, provide a detailed answer based on them.\n"
+                "If the articles don't contain specific information about the question, acknowledge this, but "
+                "provide any related insights from the available articles.\n"
+                "Do not make up information that is not present in the articles.\n"
+                "Keep the answer concise and informative.\n"
+                "\n"
+                "IMPORTANT SAFETY GUIDELINES:\n"
+                "- Do not provide advice on illegal activities, scams, or fraudulent schemes\n"
+                "- Do not promote harmful financial practices or risky investments\n"
+                "- Do not generate content that could be considered offensive, discriminatory, or inappropriate\n"
+                "- If asked about potentially harmful topics, politely redirect to legitimate crypto news and "
+                "information\n"
+                "- Focus on factual, educational content about cryptocurrency markets and technology\n"
+            )
         )
 
-    def _create_retriever(self):
-        """Create a retriever from the vector store"""
-
-        async def retrieve_docs(question: str) -> List[NewsArticle]:
-            # get embedding for the question
-            query_embedding = await embedding_service.get_embedding(question)
-
-            # search for similar articles
-            articles = await vector_store.search_similar(
-                query_embedding=query_embedding, limit=settings.max_retrieval_results
-            )
+    async def _retrieve_docs(self, question: str, query_embedding: Optional[List[float]] = None) -> List[NewsArticle]:
+        """Retrieve the articles most relevant to a question from the vector store"""
+        # get embedding for the question, unless it was already computed
+        if query_embedding is None:
+            query_embedding = await query_embedder.get_embedding(question)
+
+        # reuse results of a near-identical recent query
+        use_cache = not _TIME_SENSITIVE_PATTERN.search(question)
+        if use_cache:
+            articles = self.query_cache.get(query_embedding)
+            if articles is not None:
+                logger.info("RAG: Reusing articles retrieved for a similar recent query")
+                return articles
+
+        # search for similar articles
+        articles = await vector_store.search_similar(
+            query_embedding=query_embedding,
+            limit=settings.max_retrieval_results,
+            score_threshold=settings.retrieval_score_threshold,
+        )
 
-            return articles
+        if use_cache:
+            self.query_cache.put(query_embedding, articles)
+        return articles
 
-        return retrieve_docs
+    def _convert_to_messages(self, chat_history: List[Dict[str, str]], max_turns: Optional[int] = None) -> List:
+        """Convert the last max_turns exchanges of chat history to LangChain messages"""
+        if max_turns is None:
+            max_turns = settings.max_history_turns
 
-    def _convert_to_messages(self, chat_history: List[Dict[str, str]]) -> List:
-        """Convert chat history to LangChain messages"""
         messages = []
-        for msg in chat_history:
-            if msg.get("role") == "user":
-                messages.append(HumanMessage(content=msg.get("content", "")))
-            elif msg.get("role") == "assistant":
-                messages.append(AIMessage(content=msg.get("content", "")))
+        for msg in chat_history[max(len(chat_history) - 2 * max_turns, 0) :]:
+            message_type = _MESSAGE_TYPES.get(msg.get("role"))
+            if message_type:
+                messages.append(message_type(content=msg.get("content", "")))
         return messages
 
     def _format_context(self, articles: List[NewsArticle]) -> str:
@@ -118,86 +148,139 @@ class RAGChain:
                 "The system is still ingesting news articles. Please try again in a few minutes."
             )
 
-        context_parts = []
-        for i, article in enumerate(articles, 1):
-            context_parts.append(f"{i}. {article.title}")
-            if article.summary:
-                context_parts.append(f"   Summary: {article.summary}")
-            context_parts.append(f"   Source: {article.source}")
-            context_parts.append(f"   Published: {article.published_at.strftime('%Y-%m-%d %H:%M:%S UTC')}")
-            context_parts.append("")
+        # one pre-formatted block per article
+        blocks = [
+            f"{i}. {article.title}\n"
+            + (f"   Summary: {article.summary}\n" if article.summary else "")
+            + f"   Source: {article.source}\n"
+            + f"   Published: {article.published_at:%Y-%m-%d %H:%M:%S UTC}\n"
+            for i, article in enumerate(articles, 1)
+        ]
+        return "\n".join(blocks)
+
+    def _answer_messages(self, context: str, messages: List[BaseMessage], question: str) -> List[BaseMessage]:
+        """Build the answer prompt, no template formatting needed"""
+        # retrieved articles go in their own message so the static instructions stay a cacheable prefix
+        return [
+            self.answer_instructions,
+            SystemMessage(content="Retrieved News Articles:\n" + context),
+            *messages,
+            HumanMessage(content=question),
+        ]
+
+    @staticmethod
+    def _moderation_result(question: str) -> Dict[str, Any]:
+        return {
+            "answer": (
+                "I apologize, but I cannot help with that request. "
+                "Please ask questions related to cryptocurrency news and legitimate market information."
+            ),
+            "sources": [],
+            "question": question,
+        }
+
+    async def _prepare_answer(
+        self, question: str, chat_history: List[Dict[str, str]] = None
+    ) -> Optional[Tuple[List[BaseMessage], List[NewsArticle]]]:
+        """Retrieve articles for a question, returning the answer prompt messages and the sources
+
+        Returns None when the question triggers moderation.
+        """
+        logger.info(f"RAG: Processing question: '{question[:50]}...'")
+
+        # Convert chat history to LangChain messages
+        messages = self._convert_to_messages(chat_history or [])
+        if messages:
+            logger.info(f"RAG: Using {len(messages)} previous messages for context")
+
+        # step 1: generate better search query using conversation history
+        search_query = question
+        query_embedding = None
+        if messages:
+            # embed the raw question while the query is rewritten, in case the rewrite keeps it as is
+            speculative_embedding = asyncio.create_task(query_embedder.get_embedding(question))
+
+            logger.info("RAG: Generating history-aware search query...")
+            try:
+                search_query_result: AIMessage = await self._history_chain.ainvoke(
+                    {"question": question, "chat_history": messages}
+                )
+            except BaseException:
+                speculative_embedding.cancel()
+                raise
+            search_query = search_query_result.content
+
+            # check for moderation response
+            if _MODERATION_PATTERN.search(search_query):
+                logger.warning(f"RAG: Moderation triggered for question: '{question[:50]}...'")
+                speculative_embedding.cancel()
+                return None
+
+            logger.info(f"RAG: Generated search query: '{search_query[:50]}...'")
+
+            if _same_terms(search_query, question):
+                query_embedding = await speculative_embedding
+            else:
+                speculative_embedding.cancel()
+
+        # step 2: retrieve relevant articles using enhanced query
+        logger.info(f"RAG: Searching for articles with query: '{search_query[:50]}...'")
+        articles = await self._retrieve_docs(search_query, query_embedding)
+        logger.info(f"RAG: Found {len(articles)} relevant articles")
+
+        # step 3: build answer prompt from retrieved context and conversation history
+        context = self._format_context(articles)
+        logger.debug(f"RAG: Context length: {len(context)} characters")
 
-        return "\n".join(context_parts)
+        return self._answer_messages(context, messages, question), articles
 
     async def answer_question(self, question: str, chat_history: List[Dict[str, str]] = None) -> Dict[str, Any]:
         """Answer a question using the RAG chain with conversation history"""
         try:
-            logger.info(f"RAG: Processing question: '{question[:50]}...'")
-
-            # Convert chat history to LangChain messages
-            messages = self._convert_to_messages(chat_history or [])
-            if messages:
-                logger.info(f"RAG: Using {len(messages)} previous messages for context")
-
-            # step 1: generate better search query using conversation history
-            search_query = question
-            if messages:
-                logger.info("RAG: Generating history-aware search query...")
-                history_chain = self.history_prompt | self.llm
-                search_query_result = await history_chain.ainvoke({"question": question, "chat_history": messages})
-                # extract content from aimessage
-                if hasattr(search_query_result, "content"):
-                    search_query = search_query_result.content
-                else:
-                    search_query = str(search_query_result)
-
-                # check for moderation response
-                if "I cannot help with that request" in search_query:
-                    logger.warning(f"RAG: Moderation triggered for question: '{question[:50]}...'")
-                    return {
-                        "answer": (
-                            "I apologize, but I cannot help with that request. "
-                            "Please ask questions related to cryptocurrency news and legitimate market information."
-                        ),
-                        "sources": [],
-                        "question": question,
-                    }
-
-                logger.info(f"RAG: Generated search query: '{search_query[:50]}...'")
-
-            # step 2: retrieve relevant articles using enhanced query
-            logger.info(f"RAG: Searching for articles with query: '{search_query[:50]}...'")
-            articles = await self._create_retriever()(search_query)
-            logger.info(f"RAG: Found {len(articles)} relevant articles")
-
-            # deduplicate articles based on url
-            seen_urls = set()
-            unique_articles = []
-            for article in articles:
-                if article.url not in seen_urls:
-                    seen_urls.add(article.url)
-                    unique_articles.append(article)
-
-            logger.info(f"RAG: Deduplicated to {len(unique_articles)} unique articles")
-
-            # step 3: generate answer using retrieved context and conversation history
-            context = self._format_context(unique_articles)
-            logger.debug(f"RAG: Context length: {len(context)} characters")
-
-            # create input for answer chain
-            answer_chain = self.answer_prompt | self.llm
-            chain_input = {"context": context, "chat_history": messages, "question": question}
-
-            # run answer chain
+            prepared = await self._prepare_answer(question, chat_history)
+            if prepared is None:
+                return self._moderation_result(question)
+            answer_messages, articles = prepared
+
+            # generate answer
             logger.info("RAG: Generating answer with context and history...")
-            result = await answer_chain.ainvoke(chain_input)
-            if hasattr(result, "content"):
-                answer = result.content
-            else:
-                answer = str(result)
+            result: AIMessage = await self.llm.ainvoke(answer_messages, **self._answer_kwargs)
+            answer = result.content
+            logger.info(f"RAG: Generated answer ({len(answer)} characters)")
+
+            return {"answer": answer, "sources": articles, "question": question}
+
+        except Exception as e:
+            logger.error(f"Error in RAG chain for question '{question[:50]}...': {e}", exc_info=True)
+            raise
+
+    async def answer_question_stream(
+        self, question: str, chat_history: List[Dict[str, str]] = None
+    ) -> AsyncGenerator[Union[str, Dict[str, Any]], None]:
+        """Answer a question like answer_question, streaming the answer as the LLM generates it
+
+        Yields answer text chunks as strings, then the complete result dict.
+        """
+        try:
+            prepared = await self._prepare_answer(question, chat_history)
+            if prepared is None:
+                result = self._moderation_result(question)
+                yield result["answer"]
+                yield result
+                return
+            answer_messages, articles = prepared
+
+            # stream answer
+            logger.info("RAG: Streaming answer with context and history...")
+            answer_parts = []
+            async for chunk in self.llm.astream(answer_messages, **self._answer_kwargs):
+                if chunk.content:
+                    answer_parts.append(chunk.content)
+                    yield chunk.content
+            answer = "".join(answer_parts)
             logger.info(f"RAG: Generated answer ({len(answer)} characters)")
 
-            return {"answer": answer, "sources": unique_articles, "question": question}
+            yield {"answer": answer, "sources": articles, "question": question}
 
         except Exception as e:
             logger.error(f"Error in RAG chain for question '{question[:50]}...': {e}", exc_info=True)
@@ -205,8 +288,16 @@ class RAGChain:
 
     async def get_relevant_articles(self, question: str) -> List[NewsArticle]:
         """Get relevant articles for a question without generating an answer"""
-        return await self._create_retriever()(question)
+        return await self._retrieve_docs(question)
+
+
+# Global RAG chain instance, constructed on first use
+_rag_chain: Optional[RAGChain] = None
 
 
-# Global RAG chain instance
-rag_chain = RAGChain()
+def get_rag_chain() -> RAGChain:
+    """Get the global RAG chain, creating it on first call"""
+    global _rag_chain
+    if _rag_chain is None:
+        _rag_chain = RAGChain()
+    return _rag_chain